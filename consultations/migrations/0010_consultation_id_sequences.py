@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-15 09:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0009_consultation_rescheduled_at'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            CREATE SEQUENCE IF NOT EXISTS consultation_id_seq;
+            SELECT setval(
+                'consultation_id_seq',
+                COALESCE(
+                    (SELECT MAX(CAST(SUBSTRING(id FROM 4) AS BIGINT))
+                     FROM consultations WHERE id ~ '^CON[0-9]+$'),
+                    0
+                ) + 1,
+                false
+            );
+            """,
+            reverse_sql="DROP SEQUENCE IF EXISTS consultation_id_seq;"
+        ),
+        migrations.RunSQL(
+            """
+            CREATE SEQUENCE IF NOT EXISTS receipt_number_seq;
+            SELECT setval(
+                'receipt_number_seq',
+                COALESCE(
+                    (SELECT MAX(CAST(SUBSTRING(receipt_number FROM 4) AS BIGINT))
+                     FROM consultation_receipts WHERE receipt_number ~ '^RCP[0-9]+$'),
+                    0
+                ) + 1,
+                false
+            );
+            """,
+            reverse_sql="DROP SEQUENCE IF EXISTS receipt_number_seq;"
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-15 09:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0010_consultation_id_sequences'),
+        ('doctors', '0014_update_all_consultation_durations_to_5'),
+        ('eclinic', '0009_add_clinic_patient_model'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['-scheduled_date', '-scheduled_time'], name='cons_sched_desc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['patient', '-scheduled_date'], name='consultatio_patient_54ea59_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['doctor', '-scheduled_date'], name='consultatio_doctor__6fd767_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['clinic', 'status', '-scheduled_date'], name='consultatio_clinic__1677bb_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-15 09:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0011_consultation_schedule_indexes'),
+        ('doctors', '0014_update_all_consultation_durations_to_5'),
+        ('eclinic', '0009_add_clinic_patient_model'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(condition=models.Q(('status__in', ['scheduled', 'patient_checked_in', 'ready_for_consultation', 'in_progress', 'overdue'])), fields=['scheduled_date', 'scheduled_time'], name='cons_live_sched_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-15 09:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0012_consultation_live_schedule_index'),
+        ('doctors', '0014_update_all_consultation_durations_to_5'),
+        ('eclinic', '0009_add_clinic_patient_model'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['status', 'scheduled_date'], name='consultatio_status_4b3b7b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultationreceipt',
+            index=models.Index(fields=['payment_status'], name='consultatio_payment_068471_idx'),
+        ),
+    ]
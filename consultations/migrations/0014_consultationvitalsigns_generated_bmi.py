@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-15 09:49
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def preserve_unrecoverable_bmi(apps, schema_editor):
+    """Copy BMI values that cannot be recomputed from height and weight into notes"""
+    ConsultationVitalSigns = apps.get_model('consultations', 'ConsultationVitalSigns')
+    orphaned = ConsultationVitalSigns.objects.filter(bmi__isnull=False).filter(
+        models.Q(height__isnull=True) | models.Q(height=0) | models.Q(weight__isnull=True)
+    ).only('id', 'bmi', 'notes')
+    for vital_signs in orphaned.iterator():
+        line = f"Recorded BMI: {vital_signs.bmi}"
+        vital_signs.notes = f"{vital_signs.notes}\n{line}" if vital_signs.notes else line
+        vital_signs.save(update_fields=['notes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0013_consultation_status_indexes'),
+    ]
+
+    # A regular column cannot be altered into a generated one, so it is recreated.
+    # Existing values are recomputed by the database from height and weight; BMI values
+    # that cannot be recomputed (no usable height/weight) are kept in the notes field.
+    operations = [
+        migrations.RunPython(preserve_unrecoverable_bmi, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='consultationvitalsigns',
+            name='bmi',
+        ),
+        migrations.AddField(
+            model_name='consultationvitalsigns',
+            name='bmi',
+            field=models.GeneratedField(db_persist=True, expression=models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(models.F('weight'), '/', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.NullIf('height', models.Value(0)), '/', models.Value(100)), '*', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.NullIf('height', models.Value(0)), '/', models.Value(100)))), output_field=models.DecimalField(decimal_places=2, max_digits=4)), output_field=models.DecimalField(blank=True, decimal_places=2, max_digits=4, null=True)),
+        ),
+    ]
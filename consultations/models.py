@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, connection
+from django.db.models import Q, F, Func, Value, Case, When, ExpressionWrapper
+from django.db.models.functions import NullIf, Now, Extract, Cast
 from django.conf import settings
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -6,9 +8,67 @@ import uuid
 from eclinic.models import Clinic
 from datetime import timedelta
 import datetime
+from zoneinfo import ZoneInfo
 from django.core.exceptions import ValidationError
 
 
+_LOCAL_TZ = ZoneInfo(settings.TIME_ZONE)
+
+# Status groups used by the Consultation state properties
+_CHECKED_IN = frozenset({'patient_checked_in', 'ready_for_consultation', 'in_progress', 'completed'})
+_READY = frozenset({'ready_for_consultation', 'in_progress', 'completed'})
+_TERMINAL_OVERDUE = frozenset({'completed', 'cancelled', 'rescheduled'})
+_TERMINAL_RESCHEDULE = frozenset({'completed', 'cancelled'})
+
+
+def _next_sequence_value(sequence_name):
+    """Allocate the next value from a database sequence"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(%s)", [sequence_name])
+        return cursor.fetchone()[0]
+
+
+class _AtTimeZone(Func):
+    """Interpret a naive timestamp in the given timezone (Postgres AT TIME ZONE)"""
+    arg_joiner = ' AT TIME ZONE '
+    template = '(%(expressions)s)'
+    output_field = models.DateTimeField()
+
+
+class ConsultationQuerySet(models.QuerySet):
+    """QuerySet helpers for consultation list endpoints"""
+    
+    def with_time_flags(self):
+        """Annotate is_overdue_db and hours_overdue_db so serializers skip per-row datetime math
+        
+        The flags are computed at query time and override the model properties, so only use
+        this on read-only list querysets, never on instances that are modified and re-serialized.
+        """
+        scheduled_at = _AtTimeZone(
+            ExpressionWrapper(F('scheduled_date') + F('scheduled_time'), output_field=models.DateTimeField()),
+            Value(settings.TIME_ZONE)
+        )
+        overdue = ~Q(status__in=sorted(_TERMINAL_OVERDUE)) & Q(scheduled_at_db__lt=Now())
+        return self.annotate(scheduled_at_db=scheduled_at).annotate(
+            is_overdue_db=Case(
+                When(overdue, then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField()
+            ),
+            hours_overdue_db=Case(
+                When(
+                    overdue,
+                    then=Cast(
+                        Extract(Now() - F('scheduled_at_db'), 'epoch'),
+                        models.FloatField()
+                    ) / Value(3600.0)
+                ),
+                default=Value(0.0),
+                output_field=models.FloatField()
+            )
+        )
+
+
 class Consultation(models.Model):
     """Main consultation model"""
     
@@ -160,36 +220,33 @@ class Consultation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ConsultationQuerySet.as_manager()
+    
     class Meta:
         db_table = 'consultations'
         verbose_name = 'Consultation'
         verbose_name_plural = 'Consultations'
         ordering = ['-scheduled_date', '-scheduled_time']
+        indexes = [
+            models.Index(fields=['-scheduled_date', '-scheduled_time'], name='cons_sched_desc_idx'),
+            models.Index(fields=['patient', '-scheduled_date']),
+            models.Index(fields=['doctor', '-scheduled_date']),
+            models.Index(fields=['clinic', 'status', '-scheduled_date']),
+            models.Index(fields=['status', 'scheduled_date']),
+            # Partial index over live consultations only, used by the overdue sweeps
+            models.Index(
+                fields=['scheduled_date', 'scheduled_time'],
+                name='cons_live_sched_idx',
+                condition=Q(status__in=[
+                    'scheduled', 'patient_checked_in', 'ready_for_consultation', 'in_progress', 'overdue'
+                ])
+            ),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.id:
-            # Generate consultation ID
-            last_consultation = Consultation.objects.order_by('id').last()
-            if last_consultation:
-                # Handle different ID formats safely
-                try:
-                    if last_consultation.id.startswith('CON'):
-                        last_number = int(last_consultation.id[3:])
-                    else:
-                        # If it doesn't start with CON, find the highest CON number
-                        con_consultations = Consultation.objects.filter(id__startswith='CON').order_by('id')
-                        if con_consultations.exists():
-                            last_con = con_consultations.last()
-                            last_number = int(last_con.id[3:])
-                        else:
-                            last_number = 0
-                    new_number = last_number + 1
-                except (ValueError, IndexError):
-                    # If parsing fails, start from 1
-                    new_number = 1
-            else:
-                new_number = 1
-            
+            # Generate consultation ID from the sequence (see migration 0010)
+            new_number = _next_sequence_value('consultation_id_seq')
             self.id = f"CON{new_number:03d}"
         
         super().save(*args, **kwargs)
@@ -199,12 +256,14 @@ class Consultation(models.Model):
     
     @property
     def scheduled_datetime(self):
-        """Get scheduled datetime"""
-        dt = datetime.datetime.combine(self.scheduled_date, self.scheduled_time)
-        # Ensure the datetime is timezone-aware to compare with timezone.now()
-        if timezone.is_naive(dt):
-            dt = timezone.make_aware(dt, timezone.get_current_timezone())
-        return dt
+        """Get scheduled datetime, memoized until the schedule changes"""
+        schedule = (self.scheduled_date, self.scheduled_time)
+        cached = self.__dict__.get('_scheduled_datetime_cache')
+        if cached is None or cached[0] != schedule:
+            # Stored date/time are local, so attach the project timezone directly
+            dt = datetime.datetime.combine(*schedule).replace(tzinfo=_LOCAL_TZ)
+            cached = self._scheduled_datetime_cache = (schedule, dt)
+        return cached[1]
     
     @property
     def actual_duration(self):
@@ -222,7 +281,10 @@ class Consultation(models.Model):
     @property
     def is_overdue(self):
         """Check if consultation is overdue"""
-        if self.status in ['completed', 'cancelled', 'rescheduled']:
+        annotated = getattr(self, 'is_overdue_db', None)
+        if annotated is not None:
+            return annotated
+        if self.status in _TERMINAL_OVERDUE:
             return False
         return self.scheduled_datetime < timezone.now()
     
@@ -230,7 +292,7 @@ class Consultation(models.Model):
     def is_eligible_for_reschedule(self):
         """Check if consultation is eligible for reschedule"""
         # Can reschedule if not completed/cancelled and either overdue or within grace period
-        if self.status in ['completed', 'cancelled']:
+        if self.status in _TERMINAL_RESCHEDULE:
             return False
         
         # Allow reschedule if overdue or within 1 hour of scheduled time
@@ -240,6 +302,9 @@ class Consultation(models.Model):
     @property
     def hours_overdue(self):
         """Calculate how many hours the consultation is overdue"""
+        annotated = getattr(self, 'hours_overdue_db', None)
+        if annotated is not None:
+            return annotated
         if not self.is_overdue:
             return 0
         duration = timezone.now() - self.scheduled_datetime
@@ -255,7 +320,10 @@ class Consultation(models.Model):
         self.reschedule_requested_by = requested_by
         self.reschedule_reason = reason
         self.status = 'overdue'  # Mark as overdue when reschedule is requested
-        self.save()
+        self.save(update_fields=[
+            'reschedule_requested', 'reschedule_requested_at', 'reschedule_requested_by',
+            'reschedule_reason', 'status', 'updated_at'
+        ])
         
         return True
     
@@ -267,7 +335,9 @@ class Consultation(models.Model):
         self.reschedule_approved = True
         self.reschedule_approved_by = approved_by
         self.reschedule_approved_at = timezone.now()
-        self.save()
+        self.save(update_fields=[
+            'reschedule_approved', 'reschedule_approved_by', 'reschedule_approved_at', 'updated_at'
+        ])
         
         return True
     
@@ -290,7 +360,11 @@ class Consultation(models.Model):
         self.reschedule_approved_at = None
         self.rescheduled_at = timezone.now()
         self.reschedule_reason = ""
-        self.save()
+        self.save(update_fields=[
+            'scheduled_date', 'scheduled_time', 'status', 'reschedule_requested',
+            'reschedule_approved', 'reschedule_requested_at', 'reschedule_approved_at',
+            'rescheduled_at', 'reschedule_reason', 'updated_at'
+        ])
         
         # Create reschedule record
         ConsultationReschedule.objects.create(
@@ -308,12 +382,12 @@ class Consultation(models.Model):
     @property
     def is_checked_in(self):
         """Check if patient is checked in"""
-        return self.status in ['patient_checked_in', 'ready_for_consultation', 'in_progress', 'completed']
+        return self.status in _CHECKED_IN
     
     @property
     def is_ready_for_consultation(self):
         """Check if patient is ready for consultation"""
-        return self.status in ['ready_for_consultation', 'in_progress', 'completed']
+        return self.status in _READY
     
     def check_in_patient(self, checked_in_by):
         """Mark patient as checked in"""
@@ -321,7 +395,7 @@ class Consultation(models.Model):
             self.status = 'patient_checked_in'
             self.checked_in_at = timezone.now()
             self.checked_in_by = checked_in_by
-            self.save()
+            self.save(update_fields=['status', 'checked_in_at', 'checked_in_by', 'updated_at'])
             return True
         return False
     
@@ -331,7 +405,7 @@ class Consultation(models.Model):
             self.status = 'ready_for_consultation'
             self.ready_for_consultation_at = timezone.now()
             self.ready_marked_by = marked_by
-            self.save()
+            self.save(update_fields=['status', 'ready_for_consultation_at', 'ready_marked_by', 'updated_at'])
             return True
         return False
     
@@ -340,9 +414,56 @@ class Consultation(models.Model):
         if self.status in ['ready_for_consultation', 'patient_checked_in']:
             self.status = 'in_progress'
             self.actual_start_time = timezone.now()
-            self.save()
+            self.save(update_fields=['status', 'actual_start_time', 'updated_at'])
             return True
         return False
+    
+    @classmethod
+    def bulk_check_in(cls, ids, checked_in_by):
+        """
+        Check in several scheduled consultations with a single UPDATE
+        
+        QuerySet.update() does not send post_save, so no realtime
+        consultation_status_change_notification reaches the doctor or patient
+        channels; callers that need those notifications must send them or save()
+        each instance instead.
+        """
+        now = timezone.now()
+        return cls.objects.filter(id__in=ids, status='scheduled').update(
+            status='patient_checked_in',
+            checked_in_at=now,
+            checked_in_by=checked_in_by,
+            updated_at=now
+        )
+    
+    @classmethod
+    def bulk_mark_ready(cls, ids, marked_by):
+        """
+        Mark several consultations as ready with a single UPDATE
+        
+        Like bulk_check_in, this skips post_save and its realtime notifications.
+        """
+        now = timezone.now()
+        return cls.objects.filter(id__in=ids, status__in=['scheduled', 'patient_checked_in']).update(
+            status='ready_for_consultation',
+            ready_for_consultation_at=now,
+            ready_marked_by=marked_by,
+            updated_at=now
+        )
+    
+    @classmethod
+    def bulk_start(cls, ids):
+        """
+        Start several consultations with a single UPDATE
+        
+        Like bulk_check_in, this skips post_save and its realtime notifications.
+        """
+        now = timezone.now()
+        return cls.objects.filter(id__in=ids, status__in=['ready_for_consultation', 'patient_checked_in']).update(
+            status='in_progress',
+            actual_start_time=now,
+            updated_at=now
+        )
 
 
 class ConsultationSymptom(models.Model):
@@ -431,7 +552,15 @@ class ConsultationVitalSigns(models.Model):
     # Physical measurements
     height = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, help_text="cm")
     weight = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, help_text="kg")
-    bmi = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True)
+    # Height is in cm, so BMI = weight / (height / 100)^2, computed by the database
+    bmi = models.GeneratedField(
+        expression=ExpressionWrapper(
+            F('weight') / ((NullIf('height', Value(0)) / 100) * (NullIf('height', Value(0)) / 100)),
+            output_field=models.DecimalField(max_digits=4, decimal_places=2)
+        ),
+        output_field=models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True),
+        db_persist=True
+    )
     
     # Additional measurements
     blood_glucose = models.PositiveIntegerField(null=True, blank=True, help_text="mg/dL")
@@ -455,11 +584,12 @@ class ConsultationVitalSigns(models.Model):
         return f"Vitals for {self.consultation.id}"
     
     def save(self, *args, **kwargs):
-        # Calculate BMI if height and weight are provided
-        if self.height and self.weight:
-            height_m = self.height / 100  # Convert cm to meters
-            self.bmi = self.weight / (height_m * height_m)
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
         super().save(*args, **kwargs)
+        # Generated columns are only read back on INSERT, so reload BMI after an UPDATE
+        if not adding and (update_fields is None or {'height', 'weight'} & set(update_fields)):
+            self.refresh_from_db(fields=['bmi'])
 
 
 class ConsultationAttachment(models.Model):
@@ -576,6 +706,18 @@ class ConsultationReschedule(models.Model):
         return f"Reschedule for {self.consultation.id} - {self.old_date} to {self.new_date}"
 
 
+class ConsultationReceiptManager(models.Manager):
+    """Default manager that joins the relations used by receipt_data"""
+    
+    def get_queryset(self):
+        return super().get_queryset().select_related(
+            'consultation__patient',
+            'consultation__doctor',
+            'consultation__clinic',
+            'issued_by'
+        )
+
+
 class ConsultationReceipt(models.Model):
     """Receipt for consultation payments"""
     
@@ -605,22 +747,21 @@ class ConsultationReceipt(models.Model):
     issued_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ConsultationReceiptManager()
+    
     class Meta:
         db_table = 'consultation_receipts'
         verbose_name = 'Consultation Receipt'
         verbose_name_plural = 'Consultation Receipts'
         ordering = ['-issued_at']
+        indexes = [
+            models.Index(fields=['payment_status']),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.receipt_number:
-            # Generate receipt number
-            last_receipt = ConsultationReceipt.objects.order_by('id').last()
-            if last_receipt:
-                last_number = int(last_receipt.receipt_number[3:])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
+            # Generate receipt number from the sequence (see migration 0010)
+            new_number = _next_sequence_value('receipt_number_seq')
             self.receipt_number = f"RCP{new_number:06d}"
         
         super().save(*args, **kwargs)
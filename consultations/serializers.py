@@ -421,6 +421,8 @@ class ConsultationDiagnosisCreateSerializer(serializers.ModelSerializer):
 
 class ConsultationVitalSignsSerializer(serializers.ModelSerializer):
     """Serializer for vital signs"""
+    # Generated column; declared explicitly so it keeps rendering as a decimal string
+    bmi = serializers.DecimalField(max_digits=4, decimal_places=2, read_only=True)
     
     class Meta:
         model = ConsultationVitalSigns
@@ -434,6 +436,7 @@ class ConsultationVitalSignsSerializer(serializers.ModelSerializer):
 
 class ConsultationVitalSignsCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating vital signs"""
+    bmi = serializers.DecimalField(max_digits=4, decimal_places=2, read_only=True)
     
     class Meta:
         model = ConsultationVitalSigns
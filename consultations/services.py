@@ -784,7 +784,8 @@ class ConsultationAutoCompletionService:
             
             # Find overdue consultations
             overdue_consultations = Consultation.objects.filter(
-                status__in=status_conditions
+                status__in=status_conditions,
+                scheduled_date__lte=timezone.localtime(cutoff_time).date()
             ).select_related('patient', 'doctor')
             
             # Filter by scheduled datetime
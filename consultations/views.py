@@ -99,7 +99,7 @@ class PatientConsultationView(APIView):
             }, status=status.HTTP_403_FORBIDDEN)
         
         # Get consultations for the patient
-        queryset = Consultation.objects.filter(patient=request.user).select_related('doctor', 'clinic')
+        queryset = Consultation.objects.filter(patient=request.user).select_related('doctor', 'clinic').with_time_flags()
         
         # Apply filters
         status_filter = request.query_params.get('status')
@@ -339,7 +339,7 @@ class ConsultationViewSet(ModelViewSet):
     )
     def list(self, request):
         """List consultations with pagination and filtering"""
-        queryset = self.filter_queryset(self.get_queryset())
+        queryset = self.filter_queryset(self.get_queryset()).with_time_flags()
         
         # Filter by clinic_id (for superadmin and admin users)
         clinic_id = request.query_params.get('clinic_id')
@@ -1383,7 +1383,7 @@ class ConsultationSearchView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Build query
-        queryset = Consultation.objects.select_related('patient', 'doctor', 'doctor__doctor_profile')
+        queryset = Consultation.objects.select_related('patient', 'doctor', 'doctor__doctor_profile').with_time_flags()
         
         # Apply role-based filtering
         user = request.user
@@ -2311,7 +2311,7 @@ class DoctorConsultationViewSet(ModelViewSet):
     )
     def list(self, request, *args, **kwargs):
         """List consultations with filtering and pagination"""
-        queryset = self.get_queryset()
+        queryset = self.get_queryset().with_time_flags()
         
         # Apply status filter
         status_filter = request.query_params.get('status')
@@ -5,12 +5,15 @@ This is a one-time migration script to populate the ClinicPatient table.
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from django.db.models import Count
+from django.db.models import Count, Exists, OuterRef
 
 from authentication.models import User
 from eclinic.models import Clinic, ClinicPatient
 from consultations.models import Consultation
 
+BATCH_SIZE = 500
+PROGRESS_INTERVAL = 1000
+
 
 class Command(BaseCommand):
     help = 'Migrate existing patients to clinics based on their consultation history'
@@ -24,6 +27,8 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
+        # Per-patient detail lines are only written with -v 2 or higher
+        verbose = options['verbosity'] >= 2
         
         self.stdout.write(self.style.NOTICE('Starting patient-to-clinic migration...'))
         
@@ -36,68 +41,89 @@ class Command(BaseCommand):
         self.stdout.write(f'Found {total_patients} patients to process')
         
         # Get all clinics
-        clinics = Clinic.objects.all()
-        self.stdout.write(f'Found {clinics.count()} clinics')
+        clinic_map = {clinic.id: clinic for clinic in Clinic.objects.only('id', 'name')}
+        self.stdout.write(f'Found {len(clinic_map)} clinics')
+        
+        # Aggregate consultation counts for every (patient, clinic) pair in one query,
+        # flagging pairs that are already registered so no membership set is held in memory.
+        # Rows are streamed grouped by patient, so memory stays bounded by BATCH_SIZE.
+        clinic_consultations = Consultation.objects.filter(
+            patient__role='patient',
+            clinic__isnull=False
+        )
+        # Progress is reported against the patients the pairs stream will actually visit
+        patients_with_clinics = clinic_consultations.order_by().values('patient_id').distinct().count()
+        pairs = clinic_consultations.values_list('patient_id', 'patient__name', 'clinic_id').annotate(
+            consultation_count=Count('id'),
+            already_registered=Exists(ClinicPatient.objects.filter(
+                clinic_id=OuterRef('clinic_id'),
+                patient_id=OuterRef('patient_id')
+            ))
+        ).order_by('patient_id', '-consultation_count').iterator(chunk_size=1000)
         
         migrated_count = 0
         already_exists_count = 0
-        no_clinic_count = 0
+        processed = 0
+        current_patient_id = None
+        to_create = []
         
-        with transaction.atomic():
-            for patient in patients:
-                # Find all clinics this patient has had consultations with
-                patient_consultations = Consultation.objects.filter(
-                    patient=patient,
-                    clinic__isnull=False
-                ).values('clinic').annotate(
-                    consultation_count=Count('id')
-                ).order_by('-consultation_count')
-                
-                if not patient_consultations:
-                    no_clinic_count += 1
+        for patient_id, patient_name, clinic_id, consultation_count, already_registered in pairs:
+            if patient_id != current_patient_id:
+                current_patient_id = patient_id
+                processed += 1
+                if processed % PROGRESS_INTERVAL == 0:
+                    self.stdout.write(f'  Processed {processed}/{patients_with_clinics} patients with clinic consultations')
+            
+            clinic = clinic_map.get(clinic_id)
+            
+            if clinic is None:
+                self.stdout.write(
+                    self.style.ERROR(f'  Clinic {clinic_id} not found for patient {patient_id}')
+                )
+                continue
+            
+            if already_registered:
+                already_exists_count += 1
+                if verbose:
                     self.stdout.write(
-                        self.style.WARNING(f'  Patient {patient.id} ({patient.name}) has no consultations with any clinic')
+                        f'  Patient {patient_id} already registered to clinic {clinic.name}'
+                    )
+                continue
+            
+            to_create.append(ClinicPatient(
+                clinic_id=clinic_id,
+                patient_id=patient_id,
+                registration_source='migrated',
+                registered_by=None,
+                is_active=True
+            ))
+            migrated_count += 1
+            if verbose:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'  Migrated patient {patient_id} ({patient_name}) to clinic {clinic.name} '
+                        f'({consultation_count} consultations)'
                     )
-                    continue
-                
-                for consultation_data in patient_consultations:
-                    clinic_id = consultation_data['clinic']
-                    consultation_count = consultation_data['consultation_count']
-                    
-                    try:
-                        clinic = Clinic.objects.get(id=clinic_id)
-                        
-                        # Check if already exists
-                        existing = ClinicPatient.objects.filter(
-                            clinic=clinic,
-                            patient=patient
-                        ).exists()
-                        
-                        if existing:
-                            already_exists_count += 1
-                            self.stdout.write(
-                                f'  Patient {patient.id} already registered to clinic {clinic.name}'
-                            )
-                        else:
-                            if not dry_run:
-                                ClinicPatient.objects.create(
-                                    clinic=clinic,
-                                    patient=patient,
-                                    registration_source='migrated',
-                                    registered_by=None,
-                                    is_active=True
-                                )
-                            migrated_count += 1
-                            self.stdout.write(
-                                self.style.SUCCESS(
-                                    f'  Migrated patient {patient.id} ({patient.name}) to clinic {clinic.name} '
-                                    f'({consultation_count} consultations)'
-                                )
-                            )
-                    except Clinic.DoesNotExist:
-                        self.stdout.write(
-                            self.style.ERROR(f'  Clinic {clinic_id} not found for patient {patient.id}')
-                        )
+                )
+            
+            if len(to_create) >= BATCH_SIZE:
+                self._flush(to_create, dry_run)
+        
+        self._flush(to_create, dry_run)
+        
+        # Patients with no clinic consultations, streamed separately
+        without_clinic = patients.exclude(
+            id__in=Consultation.objects.filter(clinic__isnull=False).values('patient_id')
+        )
+        if verbose:
+            no_clinic_count = 0
+            for patient in without_clinic.only('id', 'name').iterator(chunk_size=1000):
+                no_clinic_count += 1
+                self.stdout.write(
+                    self.style.WARNING(f'  Patient {patient.id} ({patient.name}) has no consultations with any clinic')
+                )
+        else:
+            no_clinic_count = without_clinic.count()
         
         # Summary
         self.stdout.write('')
@@ -112,3 +138,13 @@ class Command(BaseCommand):
         if dry_run:
             self.stdout.write('')
             self.stdout.write(self.style.WARNING('This was a DRY RUN. Run without --dry-run to apply changes.'))
+
+    def _flush(self, to_create, dry_run):
+        """Insert queued memberships in their own transaction and clear the queue"""
+        if to_create and not dry_run:
+            # Commit each batch separately so a late failure keeps earlier batches.
+            # ClinicPatient is unique on (clinic, patient), so ignore_conflicts turns
+            # rows registered concurrently since the pairs query ran into no-ops.
+            with transaction.atomic():
+                ClinicPatient.objects.bulk_create(to_create, ignore_conflicts=True)
+        to_create.clear()
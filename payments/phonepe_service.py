@@ -5,53 +5,178 @@ Handles payment initiation, status checking, and webhook processing
 import json
 import hmac
 import hashlib
-import base64
-import uuid
+import binascii
+import logging
+import os
+import ssl
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
+from functools import lru_cache
+from types import SimpleNamespace
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Status results are cached briefly so repeated polls share one PhonePe round-trip;
+# only explicit terminal states get the long TTL, anything else (PENDING, a missing
+# or unknown state) may change at any moment
+STATUS_CACHE_PENDING_TTL = 3
+STATUS_CACHE_FINAL_TTL = 60
+_FINAL_PAYMENT_STATES = frozenset({'COMPLETED', 'SUCCESS', 'FAILED', 'FAILURE'})
+
+# PhonePe webhooks are well under 4 KiB; anything far larger is rejected before hashing
+MAX_WEBHOOK_PAYLOAD_BYTES = 64 * 1024
+
+# Worker threads for the async API wrappers, kept apart from the default executor
+_HTTP_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix='phonepe')
+
+# API paths fed to the X-VERIFY hash, pre-encoded once
+_PAY_ENDPOINT = b"/pg/v1/pay"
+_STATUS_ENDPOINT = b"/pg/v1/status"
+
+# Constant request headers, extended with X-VERIFY per call
+_BASE_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json"
+}
+
+# json.dumps builds a new encoder whenever non-default options are passed, so keep one
+_COMPACT_JSON_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+
+def _check_hash_backend():
+    """Warn when SHA-256 is not served by OpenSSL 3.x (which uses SHA-NI where the CPU has it)"""
+    if hashlib.sha256.__name__ != 'openssl_sha256':
+        try:
+            with open('/proc/cpuinfo') as cpuinfo:
+                has_sha_ni = 'sha_ni' in cpuinfo.read()
+        except OSError:
+            has_sha_ni = False
+        if has_sha_ni:
+            logger.warning(
+                'hashlib is using the bundled SHA-256 implementation although the CPU '
+                'supports SHA-NI; PhonePe signatures will be computed without it'
+            )
+    elif ssl.OPENSSL_VERSION_INFO < (3, 0):
+        logger.warning(
+            'hashlib is linked against %s; OpenSSL 3.x is recommended for PhonePe signature hashing',
+            ssl.OPENSSL_VERSION
+        )
+
+
+_check_hash_backend()
+
+
+def _build_session():
+    """Create a pooled HTTP session shared by all PhonePeService instances"""
+    session = requests.Session()
+    # Retry transient gateway errors; urllib3 only retries idempotent methods on
+    # status codes, so payment POSTs are retried on connection failures only
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+    )
+    session.mount('https://api.phonepe.com', adapter)
+    session.mount('https://api-preprod.phonepe.com', adapter)
+    return session
+
+
+@lru_cache(maxsize=None)
+def _get_config():
+    """Resolve PhonePe settings once per process instead of on every PhonePeService()"""
+    environment = getattr(settings, 'PHONEPE_ENVIRONMENT', 'sandbox')
+    
+    if environment == 'production':
+        merchant_id = getattr(settings, 'PHONEPE_PROD_MERCHANT_ID', '')
+        salt_key = getattr(settings, 'PHONEPE_PROD_SALT_KEY', '')
+        salt_index = getattr(settings, 'PHONEPE_PROD_SALT_INDEX', '1')
+        base_url = getattr(settings, 'PHONEPE_PROD_PAY_URL', 'https://api.phonepe.com/apis/hermes/pg/v1/pay')
+        status_url = 'https://api.phonepe.com/apis/hermes/pg/v1/status'
+    else:
+        merchant_id = getattr(settings, 'PHONEPE_MERCHANT_ID', 'PGTESTPAYUAT86')
+        salt_key = getattr(settings, 'PHONEPE_SALT_KEY', '96434309-7796-489d-8924-ab56988a6076')
+        salt_index = getattr(settings, 'PHONEPE_SALT_INDEX', '1')
+        base_url = getattr(settings, 'PHONEPE_SANDBOX_PAY_URL', 'https://api-preprod.phonepe.com/apis/pg-sandbox/pg/v1/pay')
+        status_url = 'https://api-preprod.phonepe.com/apis/pg-sandbox/pg/v1/status'
+    
+    callback_url = getattr(settings, 'PHONEPE_CALLBACK_URL', '')
+    
+    return SimpleNamespace(
+        environment=environment,
+        merchant_id=merchant_id,
+        salt_key=salt_key,
+        salt_key_bytes=salt_key.encode(),
+        salt_index=salt_index,
+        base_url=base_url,
+        status_url=status_url,
+        callback_url=callback_url,
+        redirect_url=getattr(settings, 'PHONEPE_REDIRECT_URL', ''),
+        # Constant part of the pay payload; shallow-copied per request, never mutated
+        pay_payload_template={
+            "merchantId": merchant_id,
+            "redirectMode": "REDIRECT",
+            "callbackUrl": callback_url,
+            "paymentInstrument": {
+                "type": "PAY_PAGE"
+            }
+        }
+    )
 
 
 class PhonePeService:
     """Service class for PhonePe payment gateway integration"""
     
+    # Keep-alive connections are reused across requests instead of a new TLS handshake per call
+    _session = _build_session()
+    
+    # Empty SHA-256 state; copying it is cheaper than constructing a new hash object
+    _SHA256_TEMPLATE = hashlib.sha256()
+    
     def __init__(self):
         """Initialize PhonePe service with credentials from settings"""
-        self.environment = getattr(settings, 'PHONEPE_ENVIRONMENT', 'sandbox')
-        
-        if self.environment == 'production':
-            self.merchant_id = getattr(settings, 'PHONEPE_PROD_MERCHANT_ID', '')
-            self.salt_key = getattr(settings, 'PHONEPE_PROD_SALT_KEY', '')
-            self.salt_index = getattr(settings, 'PHONEPE_PROD_SALT_INDEX', '1')
-            self.base_url = getattr(settings, 'PHONEPE_PROD_PAY_URL', 'https://api.phonepe.com/apis/hermes/pg/v1/pay')
-        else:
-            self.merchant_id = getattr(settings, 'PHONEPE_MERCHANT_ID', 'PGTESTPAYUAT86')
-            self.salt_key = getattr(settings, 'PHONEPE_SALT_KEY', '96434309-7796-489d-8924-ab56988a6076')
-            self.salt_index = getattr(settings, 'PHONEPE_SALT_INDEX', '1')
-            self.base_url = getattr(settings, 'PHONEPE_SANDBOX_PAY_URL', 'https://api-preprod.phonepe.com/apis/pg-sandbox/pg/v1/pay')
-        
-        self.callback_url = getattr(settings, 'PHONEPE_CALLBACK_URL', '')
-        self.redirect_url = getattr(settings, 'PHONEPE_REDIRECT_URL', '')
+        config = _get_config()
+        self.environment = config.environment
+        self.merchant_id = config.merchant_id
+        self.salt_key = config.salt_key
+        # Pre-encoded once per process for the X-VERIFY hash
+        self._salt_key_bytes = config.salt_key_bytes
+        self.salt_index = config.salt_index
+        self.base_url = config.base_url
+        self.status_url = config.status_url
+        self.callback_url = config.callback_url
+        self.redirect_url = config.redirect_url
+        self._payload_template = config.pay_payload_template
     
     def _generate_x_verify_header(self, payload_string, endpoint):
         """
         Generate X-VERIFY header for PhonePe API requests
         Format: SHA256(payload_string + endpoint + salt_key)###salt_index
+        
+        endpoint is the pre-encoded API path, e.g. _PAY_ENDPOINT
         """
-        message = payload_string + endpoint + self.salt_key
-        sha256_hash = hashlib.sha256(message.encode()).hexdigest()
-        verify_string = f"{sha256_hash}###{self.salt_index}"
-        return verify_string
+        sha256 = self._SHA256_TEMPLATE.copy()
+        sha256.update(payload_string.encode() if isinstance(payload_string, str) else payload_string)
+        sha256.update(endpoint)
+        sha256.update(self._salt_key_bytes)
+        return f"{sha256.hexdigest()}###{self.salt_index}"
     
     def _encode_base64(self, payload):
-        """Encode payload to base64"""
-        payload_string = json.dumps(payload, separators=(',', ':'))
-        return base64.b64encode(payload_string.encode()).decode()
+        """Encode payload to base64, returned as ASCII bytes ready for hashing"""
+        payload_string = _COMPACT_JSON_ENCODER.encode(payload)
+        # binascii is the C codec behind base64.b64encode, called without the wrapper
+        return binascii.b2a_base64(payload_string.encode(), newline=False)
     
     def _decode_base64(self, encoded_string):
-        """Decode base64 string to JSON"""
-        decoded_bytes = base64.b64decode(encoded_string.encode())
-        return json.loads(decoded_bytes.decode())
+        """Decode base64 string or bytes to JSON"""
+        # a2b_base64 accepts ASCII str or bytes directly, so no intermediate encode is needed
+        decoded_bytes = binascii.a2b_base64(encoded_string)
+        return json.loads(decoded_bytes)
     
     def initiate_payment(self, payment_id, amount, customer_info, additional_info=None):
         """
@@ -70,24 +195,20 @@ class PhonePeService:
             Dictionary with payment URL and transaction ID
         """
         # Convert amount to paise (multiply by 100)
-        amount_in_paise = int(float(amount) * 100)
+        # Decimal arithmetic avoids the float round-trip that can drop a paisa
+        amount_in_paise = int((amount if isinstance(amount, Decimal) else Decimal(str(amount))) * 100)
         
         # Generate unique transaction ID
-        transaction_id = f"TXN{payment_id}{uuid.uuid4().hex[:8].upper()}"
+        transaction_id = f"TXN{payment_id}{os.urandom(4).hex().upper()}"
         
         # Prepare payload
         payload = {
-            "merchantId": self.merchant_id,
+            **self._payload_template,
             "merchantTransactionId": transaction_id,
             "merchantUserId": customer_info.get('mobile', ''),
             "amount": amount_in_paise,
             "redirectUrl": f"{self.redirect_url}?transaction_id={transaction_id}",
-            "redirectMode": "REDIRECT",
-            "callbackUrl": f"{self.callback_url}",
-            "mobileNumber": customer_info.get('mobile', ''),
-            "paymentInstrument": {
-                "type": "PAY_PAGE"
-            }
+            "mobileNumber": customer_info.get('mobile', '')
         }
         
         # Add customer details if available
@@ -102,31 +223,33 @@ class PhonePeService:
         encoded_payload = self._encode_base64(payload)
         
         # Generate X-VERIFY header
-        endpoint = "/pg/v1/pay"
-        x_verify = self._generate_x_verify_header(encoded_payload, endpoint)
+        x_verify = self._generate_x_verify_header(encoded_payload, _PAY_ENDPOINT)
         
         # Prepare request
-        headers = {
-            "Content-Type": "application/json",
-            "X-VERIFY": x_verify,
-            "Accept": "application/json"
-        }
+        headers = {**_BASE_HEADERS, "X-VERIFY": x_verify}
         
         request_payload = {
-            "request": encoded_payload
+            "request": encoded_payload.decode('ascii')
         }
         
         try:
             # Make API call
-            response = requests.post(
+            response = self._session.post(
                 self.base_url,
                 json=request_payload,
                 headers=headers,
                 timeout=30
             )
             
-            response.raise_for_status()
-            response_data = response.json()
+            # Checked directly rather than via raise_for_status() to skip building an exception
+            if response.status_code >= 400:
+                return {
+                    'success': False,
+                    'error': f'HTTP {response.status_code}',
+                    'response': {}
+                }
+            # PhonePe returns UTF-8 JSON; parse the raw bytes instead of going through response.text
+            response_data = json.loads(response.content)
             
             # Check if payment initiation was successful
             if response_data.get('success') and response_data.get('data'):
@@ -169,12 +292,10 @@ class PhonePeService:
         Returns:
             Dictionary with payment status and details
         """
-        # Build status check endpoint
-        status_endpoint = "/pg/v1/status"
-        if self.environment == 'production':
-            status_url = "https://api.phonepe.com/apis/hermes/pg/v1/status"
-        else:
-            status_url = "https://api-preprod.phonepe.com/apis/pg-sandbox/pg/v1/status"
+        cache_key = f"phonepe:status:{merchant_transaction_id}"
+        cached_result = cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
         
         # Prepare payload
         payload = {
@@ -186,31 +307,33 @@ class PhonePeService:
         encoded_payload = self._encode_base64(payload)
         
         # Generate X-VERIFY header
-        x_verify = self._generate_x_verify_header(encoded_payload, status_endpoint)
+        x_verify = self._generate_x_verify_header(encoded_payload, _STATUS_ENDPOINT)
         
         # Prepare request
-        headers = {
-            "Content-Type": "application/json",
-            "X-VERIFY": x_verify,
-            "X-MERCHANT-ID": self.merchant_id,
-            "Accept": "application/json"
-        }
+        headers = {**_BASE_HEADERS, "X-VERIFY": x_verify, "X-MERCHANT-ID": self.merchant_id}
         
         request_payload = {
-            "request": encoded_payload
+            "request": encoded_payload.decode('ascii')
         }
         
         try:
             # Make API call (PhonePe status API uses POST)
-            response = requests.post(
-                status_url,
+            response = self._session.post(
+                self.status_url,
                 json=request_payload,
                 headers=headers,
                 timeout=30
             )
             
-            response.raise_for_status()
-            response_data = response.json()
+            # Checked directly rather than via raise_for_status() to skip building an exception
+            if response.status_code >= 400:
+                return {
+                    'success': False,
+                    'error': f'HTTP {response.status_code}',
+                    'response': {}
+                }
+            # PhonePe returns UTF-8 JSON; parse the raw bytes instead of going through response.text
+            response_data = json.loads(response.content)
             
             # Decode response if it contains encoded data
             if response_data.get('success') and response_data.get('data'):
@@ -224,7 +347,7 @@ class PhonePeService:
                     state = decoded_response.get('state', '')
                     transaction_id = decoded_response.get('transactionId', '')
                     
-                    return {
+                    result = {
                         'success': True,
                         'status': state,
                         'code': code,
@@ -232,6 +355,12 @@ class PhonePeService:
                         'response': decoded_response,
                         'raw_response': response_data
                     }
+                    cache.set(
+                        cache_key,
+                        result,
+                        timeout=STATUS_CACHE_FINAL_TTL if state in _FINAL_PAYMENT_STATES else STATUS_CACHE_PENDING_TTL
+                    )
+                    return result
             
             return {
                 'success': False,
@@ -252,6 +381,26 @@ class PhonePeService:
                 'response': {}
             }
     
+    async def ainitiate_payment(self, payment_id, amount, customer_info, additional_info=None):
+        """
+        Async variant of initiate_payment for ASGI views
+        
+        The blocking HTTP call runs in a worker thread so the event loop stays free.
+        """
+        return await sync_to_async(self.initiate_payment, thread_sensitive=False, executor=_HTTP_EXECUTOR)(
+            payment_id, amount, customer_info, additional_info
+        )
+    
+    async def acheck_payment_status(self, merchant_transaction_id):
+        """
+        Async variant of check_payment_status for ASGI views
+        
+        The blocking HTTP call runs in a worker thread so the event loop stays free.
+        """
+        return await sync_to_async(self.check_payment_status, thread_sensitive=False, executor=_HTTP_EXECUTOR)(
+            merchant_transaction_id
+        )
+    
     def verify_webhook_signature(self, payload, x_verify_header):
         """
         Verify webhook signature from PhonePe
@@ -264,22 +413,24 @@ class PhonePeService:
             Boolean indicating if signature is valid
         """
         try:
-            # Extract hash and salt index from header
-            # Format: hash###salt_index
-            parts = x_verify_header.split('###')
-            if len(parts) != 2:
+            if len(payload) > MAX_WEBHOOK_PAYLOAD_BYTES:
                 return False
             
-            received_hash = parts[0]
-            salt_index = parts[1]
+            # Extract hash from header
+            # Format: hash###salt_index, where hash is a 64-char SHA-256 hex digest
+            received_hash, separator, _ = x_verify_header.partition('###')
+            if not separator or len(received_hash) != 64:
+                # Malformed header: fail before doing any hash work
+                return False
             
             # Recalculate hash
             # PhonePe webhook: SHA256(payload + salt_key)###salt_index
-            message = payload + self.salt_key
-            calculated_hash = hashlib.sha256(message.encode()).hexdigest()
+            sha256 = self._SHA256_TEMPLATE.copy()
+            sha256.update(payload.encode() if isinstance(payload, str) else payload)
+            sha256.update(self._salt_key_bytes)
             
             # Compare hashes using constant-time comparison
-            return hmac.compare_digest(calculated_hash, received_hash)
+            return hmac.compare_digest(sha256.hexdigest(), received_hash)
             
         except Exception:
             return False
@@ -298,14 +449,22 @@ class PhonePeService:
         try:
             # Verify signature if webhook data is string
             if isinstance(webhook_data, str):
-                if not self.verify_webhook_signature(webhook_data, x_verify_header):
+                if len(webhook_data) > MAX_WEBHOOK_PAYLOAD_BYTES:
+                    return {
+                        'success': False,
+                        'error': 'Webhook payload too large',
+                        'response': {}
+                    }
+                # Encode once; the hash and the base64 decoder both read the same buffer
+                webhook_bytes = webhook_data.encode()
+                if not self.verify_webhook_signature(webhook_bytes, x_verify_header):
                     return {
                         'success': False,
                         'error': 'Invalid webhook signature',
                         'response': {}
                     }
                 # Decode base64 if needed
-                webhook_data = self._decode_base64(webhook_data)
+                webhook_data = self._decode_base64(webhook_bytes)
             
             # Extract payment information
             transaction_id = webhook_data.get('transactionId', '')
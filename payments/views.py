@@ -290,7 +290,7 @@ class PaymentViewSet(ModelViewSet):
         # Initiate payment
         result = phonepe_service.initiate_payment(
             payment_id=payment.id,
-            amount=float(payment.net_amount),
+            amount=payment.net_amount,
             customer_info=customer_info,
             additional_info=additional_info
         )